@@ -1,8 +1,136 @@
-from scipy.optimize import *
-from itertools import *
-from numpy import transpose, ndarray
+from math import comb
+from itertools import chain, combinations
+from dataclasses import dataclass
+from functools import lru_cache
+from scipy import sparse
+import numpy as np
 import sys
 
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    # numba is optional, without it the kernels below are never called
+    HAVE_NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda f: f
+
+try:
+    import highspy
+except ImportError:
+    # highspy is optional, without it the LP is solved through scipy's linprog. scipy.optimize is only
+    # imported in that case, since it takes most of this module's import time
+    highspy = None
+    from scipy.optimize import linprog
+
+try:
+    import cupy as cp
+    # cupy also imports on hosts without a CUDA device or driver, and only fails once it touches the gpu
+    if cp.cuda.runtime.getDeviceCount() == 0:
+        cp = None
+except (ImportError, RuntimeError):
+    # cupy is optional, without it or a usable gpu the payoff matrix is built on the cpu
+    cp = None
+
+# HiGHS instance shared by every LP solved in this process, see get_highs_solver
+_highs_solver = None
+
+# integer codes of each objective, used to select the branch inside the jitted kernels
+OBJECTIVE_CODES = {"score": 0, "win": 1, "lottery": 2}
+
+# number of rows of the payoff matrix computed per broadcast in get_payoff_matrix
+PAYOFF_BLOCK_ROWS = 256
+
+# number of pure strategies below which the payoff matrix is built on the cpu even with cupy, since the
+# host-device transfers outweigh the gpu's speedup on small games
+GPU_MIN_PURE_STRATS = 4096
+
+# fraction of the payoff matrix that has to become zero for get_payoff_shift to shift it
+MIN_SHIFT_ZERO_FRACTION = 0.1
+
+@dataclass
+class GeneralStrategy:
+    """a general strategy, stored as its pure strategies and the probability of playing each one
+
+    Attributes:
+        coords (ndarray): int32 array of shape (num_pure_strats, num_battlefields), one pure strategy per row
+        probs (ndarray): float64 array of shape (num_pure_strats,), the probability of playing each pure strategy
+    """
+    coords: np.ndarray
+    probs: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows):
+        """builds a general strategy from rows where each entry is a pure strategy followed by the probability of playing that strategy
+
+        Args:
+            rows (list): list or 2d array of rows, as read from the command line input
+
+        Returns:
+            GeneralStrategy: the same general strategy
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        coords = rows[:, :-1].astype(np.int32)
+        probs = np.ascontiguousarray(rows[:, -1])
+        return cls(coords, probs)
+
+def get_strategy_dtype(units):
+    """gets the smallest integer dtype that can hold any number of units on a battlefield
+
+    Args:
+        units (int): the number of units to distribute for each player
+
+    Returns:
+        dtype: int8, int16 or int32
+    """
+    for dtype in (np.int8, np.int16):
+        if units <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int32)
+
+def get_strategy_array(strategies):
+    """gets strategies as a contiguous integer array, keeping their dtype if it already is an integer one
+
+    Args:
+        strategies (list): list or array of pure strategies
+
+    Returns:
+        ndarray: integer array with one pure strategy per row
+    """
+    strategies = np.ascontiguousarray(strategies)
+    if strategies.dtype.kind not in "iu":
+        strategies = strategies.astype(np.int32)
+    return strategies
+
+@lru_cache(maxsize=32)
+def get_pure_strategy_array(units, num_battlefields):
+    """ get all pure strategies as an array, in lexicographic order. the result only depends on units and
+    the number of battlefields, so it is cached and returned read-only
+
+    Args:
+        units (int): the number of units to distribute for each player
+        num_battlefields (int): the number of battlefields
+
+    Returns:
+        ndarray: array of shape (num_strats, num_battlefields) of dtype get_strategy_dtype(units), where each row
+        is the number of units assigned to each battlefield
+    """
+    # stars and bars: a pure strategy is a choice of k - 1 bar positions among units + k - 1 slots,
+    # so there are C(units + k - 1, k - 1) of them, and lexicographic bar positions give lexicographic strategies
+    num_strats = comb(units + num_battlefields - 1, num_battlefields - 1)
+    bars = np.empty((num_strats, num_battlefields + 1), dtype=np.int32)
+    bars[:, 0] = -1
+    bars[:, 1:num_battlefields] = np.fromiter(
+        chain.from_iterable(combinations(range(units + num_battlefields - 1), num_battlefields - 1)),
+        dtype=np.int32, count=num_strats * (num_battlefields - 1)).reshape(num_strats, num_battlefields - 1)
+    bars[:, num_battlefields] = units + num_battlefields - 1
+    # the units on each battlefield are the stars between two consecutive bars
+    pure_strategies = (np.diff(bars, axis=1) - 1).astype(get_strategy_dtype(units))
+    pure_strategies.setflags(write=False)
+
+    return pure_strategies
+
 def get_pure_strategies(units, values):
     """ get a list of pure strategies
 
@@ -11,17 +139,10 @@ def get_pure_strategies(units, values):
         values (list): a list of values of each battlefield
 
     Returns:
-        list: list of pure strategies, where each pure strategy is a list of the 
+        ndarray: read-only array of pure strategies, where each row is the 
         number of units assigned to each battlefield
     """
-    num_battlefields = len(values)
-    pure_strategies = []
-
-    for combo in product(range(units + 1), repeat=num_battlefields):
-        if sum(combo) == units:
-            pure_strategies.append(list(combo))
-
-    return pure_strategies
+    return get_pure_strategy_array(units, len(values))
 
 def get_expected_value_pure_strategies(strategy1, strategy2, values, obj):
     """ get the expected value for player with strategy1 when going up against someone using strategy2 with obj as objective
@@ -35,86 +156,295 @@ def get_expected_value_pure_strategies(strategy1, strategy2, values, obj):
     Returns:
         float: expected value of player 1 score
     """
-    num_battlefields = len(values)
-    expected_value = 0
-    if obj == "score":
-        for i in range(num_battlefields):
-            if strategy1[i] > strategy2[i]:
-                expected_value += values[i]
-            elif strategy1[i] == strategy2[i]:
-                expected_value += values[i]/2
-    elif obj == "win":
-        p1_score = 0
-        p2_score = 0
-        for i in range(num_battlefields):
-            if strategy1[i] > strategy2[i]:
-                p1_score += values[i]
-            elif strategy1[i] == strategy2[i]:
-                p1_score += values[i]/2
-                p2_score += values[i]/2
-            else:
-                p2_score += values[i]
-        if p1_score > p2_score:
-            expected_value = 1
-        elif p1_score == p2_score:
-            expected_value = 0.5
+    if HAVE_NUMBA and obj in OBJECTIVE_CODES:
+        # one conversion per argument and a direct call of the jitted pair kernel, without a parallel launch
+        return float(_ev_pure(np.asarray(strategy1), np.asarray(strategy2), np.asarray(values), OBJECTIVE_CODES[obj]))
+    # a 1x1 block of the broadcast fallback
+    return float(get_payoff_block([strategy1], [strategy2], values, obj)[0, 0])
+
+@njit(cache=True, inline="always")
+def _ev_score(s1, s2, v):
+    expected_value = 0.0
+    for i in range(s1.shape[0]):
+        expected_value += 0.5 * v[i] * ((s1[i] > s2[i]) + (s1[i] >= s2[i]))
+    return expected_value
+
+@njit(cache=True, inline="always")
+def _ev_win(s1, s2, v):
+    p1_score = _ev_score(s1, s2, v)
+    return np.sign(2.0 * p1_score - v.sum()) * 0.5 + 0.5
+
+@njit(cache=True, inline="always")
+def _ev_lottery(s1, s2, v):
+    expected_value = 0.0
+    for i in range(s1.shape[0]):
+        if s1[i] == s2[i]:
+            expected_value += 0.5 * v[i]
         else:
-            expected_value = 0
-    
-    elif obj == "lottery":
-        for i in range(num_battlefields):
-            prob_p1_wins = None
-            if strategy1[i] == strategy2[i]:
-                prob_p1_wins = 1/2
-            else:
-                prob_p1_wins = strategy1[i] * strategy1[i] / (strategy1[i] * strategy1[i] + strategy2[i] * strategy2[i])
-            expected_value += prob_p1_wins * values[i]
-    
+            sq1 = float(s1[i]) * s1[i]
+            sq2 = float(s2[i]) * s2[i]
+            expected_value += sq1 / (sq1 + sq2) * v[i]
     return expected_value
 
+@njit(cache=True, inline="always")
+def _ev_pure(s1, s2, v, mode):
+    if mode == 0:
+        return _ev_score(s1, s2, v)
+    elif mode == 1:
+        return _ev_win(s1, s2, v)
+    return _ev_lottery(s1, s2, v)
+
+@njit(cache=True, parallel=True)
+def _build_payoff_block(S1, S2, v, mode):
+    payoff_block = np.empty((S1.shape[0], S2.shape[0]))
+    for i in prange(S1.shape[0]):
+        for j in range(S2.shape[0]):
+            payoff_block[i, j] = _ev_pure(S1[i], S2[j], v, mode)
+    return payoff_block
+
 def get_expected_value_general_strategies(g_strategy1, g_strategy2, values, obj):
     """get the expected value of player with g_strategy1 when going up against someone using gstrategy2
 
     Args:
-        g_strategy1 (list): a list where each entry is a pure strategy followed by the probability of playing that strategy
-        g_strategy2 (list): a list where each entry is a pure strategy followed by the probability of playing that strategy
+        g_strategy1 (GeneralStrategy): general strategy of player 1, or a list where each entry is a pure strategy
+        followed by the probability of playing that strategy
+        g_strategy2 (GeneralStrategy): general strategy of player 2, in the same forms as g_strategy1
         values (list): a list of values of each battlefield
+        obj (string): "win", "score", or "lottery"
 
     Returns:
         float: expected value of player 1 score
     """
-    num_battlefields = len(values)
-    expected_value = 0
-    for pure_strategy1 in g_strategy1:
-        prob_of_p_strat_1 = pure_strategy1[num_battlefields] # retrieves last element of array
-        for pure_strategy2 in g_strategy2:
-            prob_of_p_strat_2 = pure_strategy2[num_battlefields]
-            expected_value += get_expected_value_pure_strategies(pure_strategy1, pure_strategy2, values, obj) * prob_of_p_strat_1 * prob_of_p_strat_2
-    
-    return expected_value
+    if not isinstance(g_strategy1, GeneralStrategy):
+        g_strategy1 = GeneralStrategy.from_rows(g_strategy1)
+    if not isinstance(g_strategy2, GeneralStrategy):
+        g_strategy2 = GeneralStrategy.from_rows(g_strategy2)
+    payoff_block = get_payoff_block(g_strategy1.coords, g_strategy2.coords, values, obj)
+    return float(g_strategy1.probs @ payoff_block @ g_strategy2.probs)
+
+def get_payoff_block(strategies1, strategies2, values, obj):
+    """gets the payoff of every pure strategy in strategies1 against every pure strategy in strategies2
+
+    Args:
+        strategies1 (list): list of pure strategies of player 1
+        strategies2 (list): list of pure strategies of player 2
+        values (list): a list of values of each battlefield
+        obj (string): "win", "score", or "lottery"
+
+    Returns:
+        ndarray: float64 array of shape (len(strategies1), len(strategies2)) of expected values of player 1
+    """
+    v = np.asarray(values, dtype=np.float64)
+    if HAVE_NUMBA and obj in OBJECTIVE_CODES:
+        # stream through the pairs without materializing the (len(strategies1), len(strategies2), k) comparisons
+        return _build_payoff_block(get_strategy_array(strategies1), get_strategy_array(strategies2), v, OBJECTIVE_CODES[obj])
+    return get_broadcast_payoff_block(get_strategy_array(strategies1), get_strategy_array(strategies2), v, obj, np)
+
+def get_broadcast_payoff_block(strategies1, strategies2, v, obj, xp):
+    """gets the same payoff block as get_payoff_block by broadcasting every pair of pure strategies at once,
+    with xp being either numpy or cupy so the same code runs on the cpu and the gpu
+
+    Args:
+        strategies1 (ndarray): array of pure strategies of player 1, from xp
+        strategies2 (ndarray): array of pure strategies of player 2, from xp
+        v (ndarray): float64 array of values of each battlefield, from xp
+        obj (string): "win", "score", or "lottery"
+        xp (module): numpy or cupy
+
+    Returns:
+        ndarray: float64 array of shape (len(strategies1), len(strategies2)) of expected values of player 1, from xp
+    """
+    s1 = strategies1[:, None, :]
+    s2 = strategies2[None, :, :]
+
+    if obj in ("score", "win"):
+        # number of halves of each battlefield's value player 1 gets, 2 for a win and 1 for a tie,
+        # reduced against the values in a single matmul
+        won_halves = (s1 > s2).astype(xp.int8) + (s1 >= s2)
+        p1_score = won_halves @ (0.5 * v)
+        if obj == "score":
+            return p1_score
+        p2_score = v.sum() - p1_score
+        return xp.where(p1_score > p2_score, 1.0, xp.where(p1_score == p2_score, 0.5, 0.0))
+    elif obj == "lottery":
+        sq1 = s1.astype(xp.float64) ** 2
+        sq2 = s2.astype(xp.float64) ** 2
+        denom = sq1 + sq2
+        prob_p1_wins = xp.where(s1 == s2, 0.5, sq1 / xp.where(denom == 0, 1, denom))
+        return prob_p1_wins @ v
+
+    return xp.zeros((s1.shape[0], s2.shape[1]))
+
+def get_constant_sum_total(values, obj):
+    """gets the constant sum of the game: every objective satisfies M[i, j] + M[j, i] = total
+
+    Args:
+        values (list): a list of values of each battlefield
+        obj (string): "win", "score", or "lottery"
+
+    Returns:
+        float: sum(values) for score and lottery, 1 for win, None for an unknown objective
+    """
+    if obj == "win":
+        return 1.0
+    elif obj in ("score", "lottery"):
+        return float(sum(values))
+    return None
 
 def get_payoff_matrix(pure_strategies, values, obj):
     """gets the payoff matrix of the blotto game associated with units, values, and objective
 
     Args:
-        units (int): the number of units to distribute for each player
+        pure_strategies (list): list of pure strategies
         values (list): a list of values of each battlefield
         obj (string): "win", "score", or "lottery"
 
     Returns:
-        list: the payoff matrix
+        ndarray: the payoff matrix
     """
-    payoff_matrix = []
-    num_pure_strats = len(pure_strategies)
+    # only the upper triangle has to be computed, the rest is total - M.T
+    total = get_constant_sum_total(values, obj)
+    if total is None:
+        return get_payoff_block(pure_strategies, pure_strategies, values, obj)
     
-    for i in range(num_pure_strats):
-        payoff_matrix_row = []
-        for j in range(num_pure_strats):
-            payoff_matrix_row.append(get_expected_value_pure_strategies(pure_strategies[i], pure_strategies[j], values, obj))
-        payoff_matrix.append(payoff_matrix_row)
+    strategies = get_strategy_array(pure_strategies)
+    num_pure_strats = len(strategies)
+    payoff_matrix = np.empty((num_pure_strats, num_pure_strats))
+    # go through the rows in blocks, computing each block only against itself and the columns right of it,
+    # and mirror the part right of the diagonal square into the rows below
+    for start in range(0, num_pure_strats, PAYOFF_BLOCK_ROWS):
+        stop = min(start + PAYOFF_BLOCK_ROWS, num_pure_strats)
+        block = get_payoff_block(strategies[start:stop], strategies[start:], values, obj)
+        payoff_matrix[start:stop, start:] = block
+        np.subtract(total, block[:, stop - start:].T, out=payoff_matrix[stop:, start:stop])
     
     return payoff_matrix
 
+def get_payoff_matrix_gpu(pure_strategies, values, obj):
+    """gets the same payoff matrix as get_payoff_matrix, computed on the gpu with cupy
+
+    Args:
+        pure_strategies (list): list of pure strategies
+        values (list): a list of values of each battlefield
+        obj (string): "win", "score", or "lottery"
+
+    Returns:
+        ndarray: the payoff matrix, copied back to host memory
+    """
+    strategies = cp.asarray(get_strategy_array(pure_strategies))
+    v = cp.asarray(values, dtype=cp.float64)
+    num_pure_strats = len(strategies)
+    payoff_matrix = np.empty((num_pure_strats, num_pure_strats))
+    # tile over the rows so the (rows, num_pure_strats, k) comparisons stay small next to the gpu's memory
+    for start in range(0, num_pure_strats, PAYOFF_BLOCK_ROWS):
+        stop = min(start + PAYOFF_BLOCK_ROWS, num_pure_strats)
+        block = get_broadcast_payoff_block(strategies[start:stop], strategies, v, obj, cp)
+        block.get(out=payoff_matrix[start:stop])
+    
+    return payoff_matrix
+
+@lru_cache(maxsize=4)
+def get_game_payoff_matrix(units, values, obj):
+    """gets the payoff matrix of the blotto game associated with units, values, and objective. the matrix
+    is cached per game and returned read-only, so repeated calls for the same game skip building it
+
+    Args:
+        units (int): the number of units to distribute for each player
+        values (tuple): a tuple of values of each battlefield
+        obj (string): "win", "score", or "lottery"
+
+    Returns:
+        ndarray: the payoff matrix, with rows and columns in the order of get_pure_strategies
+    """
+    pure_strategies = get_pure_strategies(units, values)
+    if cp is not None and obj in OBJECTIVE_CODES and len(pure_strategies) >= GPU_MIN_PURE_STRATS:
+        payoff_matrix = get_payoff_matrix_gpu(pure_strategies, values, obj)
+    else:
+        # with numba, the upper triangle blocks of get_payoff_matrix go through the parallel block kernel
+        payoff_matrix = get_payoff_matrix(pure_strategies, values, obj)
+    payoff_matrix.setflags(write=False)
+    return payoff_matrix
+
+def get_strategy_orbits(pure_strategies, values):
+    """groups the pure strategies that only differ by a permutation of battlefields with equal values.
+    such strategies are interchangeable for both players under every objective
+
+    Args:
+        pure_strategies (ndarray): array of pure strategies
+        values (list): a list of values of each battlefield
+
+    Returns:
+        tuple: (orbit_reps, orbit_ids, orbit_sizes), where orbit_reps has one representative pure strategy per orbit,
+        orbit_ids gives the orbit of each pure strategy and orbit_sizes the number of pure strategies in each orbit
+    """
+    # the representative of an orbit sorts the units within every group of equally valued battlefields
+    canonical = np.array(pure_strategies)
+    v = np.asarray(values)
+    for value in np.unique(v):
+        columns = np.nonzero(v == value)[0]
+        if len(columns) > 1:
+            canonical[:, columns] = np.sort(canonical[:, columns], axis=1)
+    orbit_reps, orbit_ids, orbit_sizes = np.unique(canonical, axis=0, return_inverse=True, return_counts=True)
+    return orbit_reps, orbit_ids.reshape(-1), orbit_sizes
+
+def get_orbit_payoff_matrix(pure_strategies, orbit_reps, orbit_ids, orbit_sizes, values, obj):
+    """gets the payoff matrix of the game reduced to orbits: entry [a, b] is the expected value of playing a uniformly
+    random member of orbit a against the representative of orbit b (and so against any member of orbit b)
+
+    Args:
+        pure_strategies (ndarray): array of pure strategies
+        orbit_reps (ndarray): one representative pure strategy per orbit
+        orbit_ids (ndarray): the orbit of each pure strategy
+        orbit_sizes (ndarray): the number of pure strategies in each orbit
+        values (list): a list of values of each battlefield
+        obj (string): "win", "score", or "lottery"
+
+    Returns:
+        ndarray: the (num_orbits, num_orbits) reduced payoff matrix
+    """
+    # sort the rows by orbit so each orbit's rows are one contiguous run that reduceat can sum
+    order = np.argsort(orbit_ids, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(orbit_sizes)[:-1]))
+    payoff_block = get_payoff_block(pure_strategies[order], orbit_reps, values, obj)
+    return np.add.reduceat(payoff_block, starts, axis=0) / orbit_sizes[:, None]
+
+@lru_cache(maxsize=4)
+def get_game_orbits(units, values):
+    """gets the orbits of the pure strategies of the blotto game, see get_strategy_orbits. they are cached per game
+    and returned read-only
+
+    Args:
+        units (int): the number of units to distribute for each player
+        values (tuple): a tuple of values of each battlefield
+
+    Returns:
+        tuple: (orbit_reps, orbit_ids, orbit_sizes), as returned by get_strategy_orbits
+    """
+    orbits = get_strategy_orbits(get_pure_strategies(units, values), values)
+    for array in orbits:
+        array.setflags(write=False)
+    return orbits
+
+@lru_cache(maxsize=4)
+def get_game_orbit_payoff_matrix(units, values, obj):
+    """gets the payoff matrix of the blotto game reduced to orbits, see get_orbit_payoff_matrix. like
+    get_game_payoff_matrix, it is cached per game and returned read-only. the (num_pure_strats, num_orbits) block
+    behind it is always built by get_payoff_block, never on the gpu
+
+    Args:
+        units (int): the number of units to distribute for each player
+        values (tuple): a tuple of values of each battlefield
+        obj (string): "win", "score", or "lottery"
+
+    Returns:
+        ndarray: the (num_orbits, num_orbits) reduced payoff matrix, in the orbit order of get_game_orbits
+    """
+    orbit_reps, orbit_ids, orbit_sizes = get_game_orbits(units, values)
+    orbit_payoff_matrix = get_orbit_payoff_matrix(get_pure_strategies(units, values), orbit_reps, orbit_ids,
+                                                  orbit_sizes, values, obj)
+    orbit_payoff_matrix.setflags(write=False)
+    return orbit_payoff_matrix
+
 def get_normalized_probability(probs):
     """gets the same list of probabilities but with their sum normalized to 1
 
@@ -122,114 +452,250 @@ def get_normalized_probability(probs):
         probs (list): list of probabilities
 
     Returns:
-        list: list of probabilities, normalized
+        ndarray: array of probabilities, normalized
     """
+    probs = np.asarray(probs, dtype=np.float64)
+    return probs / probs.sum()
+
+def get_constraint_matrix(payoff_matrix, normalization_row, shift=0.0):
+    """gets the constraint matrix [shift - M^T | 1] of the equilibrium LP in csc format, written straight from the
+    payoff matrix: column j of -M^T is row j of -M, so the columns are filled in one contiguous pass
+
+    Args:
+        payoff_matrix (ndarray): the payoff matrix
+        normalization_row (bool): whether to append the row x1 + x2 + x3 + ... of the normalization condition
+        shift (float): the amount subtracted from every payoff, see get_payoff_shift
+
+    Returns:
+        scipy.sparse.csc_matrix: the constraint matrix, with the variables x1, x2, x3, ..., z as columns
+    """
+    num_pure_strats = payoff_matrix.shape[0]
+    num_rows = num_pure_strats + 1 if normalization_row else num_pure_strats
+    x_nnz = num_pure_strats * num_rows
     
-    sum_probs = sum(probs)
-    multiply_factor = 1/sum_probs
-    for i in range(len(probs)):
-        probs[i] = probs[i] * multiply_factor
+    values = np.empty(x_nnz + num_pure_strats)
+    x_columns = values[:x_nnz].reshape(num_pure_strats, num_rows)
+    np.subtract(shift, payoff_matrix, out=x_columns[:, :num_pure_strats])
+    if normalization_row:
+        x_columns[:, num_pure_strats] = 1.0
+    # z has coefficient 1 in every payoff row and 0 in the normalization row
+    values[x_nnz:] = 1.0
     
-    return probs
+    indices = np.concatenate((np.tile(np.arange(num_rows, dtype=np.int32), num_pure_strats),
+                              np.arange(num_pure_strats, dtype=np.int32)))
+    indptr = np.append(np.arange(0, x_nnz + 1, num_rows), x_nnz + num_pure_strats).astype(np.int32)
+    return sparse.csc_matrix((values, indices, indptr), shape=(num_rows, num_pure_strats + 1))
 
-def print_equilibrium_general_strategy(units, values, tol, obj):
-    """gets the nash equilibrium general strategy that is optimized for win or score
+def get_highs_solver(tol):
+    """gets the HiGHS instance shared by every LP solved in this process, creating it on first use
 
     Args:
-        units (int): the number of units to distribute for each player
-        values (list): a list of values of each battlefield
         tol (float): the tolerance used for calculations
-        obj (string): "win", "score", or "lottery"
+
+    Returns:
+        highspy.Highs: the solver
+    """
+    global _highs_solver
+    if _highs_solver is None:
+        _highs_solver = highspy.Highs()
+        _highs_solver.setOptionValue("output_flag", False)
+        # presolve removes duplicate and dominated payoff rows before the simplex starts
+        _highs_solver.setOptionValue("presolve", "on")
+    _highs_solver.setOptionValue("primal_feasibility_tolerance", tol)
+    _highs_solver.setOptionValue("dual_feasibility_tolerance", tol)
+    return _highs_solver
+
+def get_equilibrium_probabilities_highs(payoff_matrix, tol, shift=0.0):
+    """solves the equilibrium LP by passing it to HiGHS directly as a sparse column-wise model
+
+    Args:
+        payoff_matrix (ndarray): the payoff matrix
+        tol (float): the tolerance used for calculations
+        shift (float): the amount subtracted from every payoff in the LP, see get_payoff_shift
+
+    Returns:
+        ndarray: the (unnormalized) probability of playing each pure strategy
     """
+    num_pure_strats = payoff_matrix.shape[0]
+    inf = highspy.kHighsInf
     
-    # the nash general strategy must be the best strategy going up against itself
-    # it must be at least as good as any pure strategy going up against the nash general strategy
-    # let z = expected_value_general_strategies(nash_gstrat, nash_gstrat, values)
-    # we must have expected_value_general_strategies(pstrat, nash_gstrat, values) <= z
-    # where pstrat is any pure strategy
+    # rows 0..N-1 are -M^T x + z <= 0, row N is x1 + x2 + x3 + ... = 1
+    a_matrix = get_constraint_matrix(payoff_matrix, normalization_row=True, shift=shift)
     
-    pure_strategies = get_pure_strategies(units, values)
-    payoff_matrix_transpose = ndarray.tolist(transpose(get_payoff_matrix(pure_strategies, values, obj)))
+    lp = highspy.HighsLp()
+    lp.num_col_ = num_pure_strats + 1
+    lp.num_row_ = num_pure_strats + 1
+    # goal is to maximize z, so minimize -z
+    lp.col_cost_ = np.append(np.zeros(num_pure_strats), -1.0)
+    # z is free, since a shifted payoff matrix has value 0 and negative entries
+    lp.col_lower_ = np.append(np.zeros(num_pure_strats), -inf)
+    lp.col_upper_ = np.append(np.ones(num_pure_strats), inf)
+    lp.row_lower_ = np.append(np.full(num_pure_strats, -inf), 1.0)
+    lp.row_upper_ = np.append(np.zeros(num_pure_strats), 1.0)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = a_matrix.indptr
+    lp.a_matrix_.index_ = a_matrix.indices
+    lp.a_matrix_.value_ = a_matrix.data
+    
+    solver = get_highs_solver(tol)
+    solver.passModel(lp)
+    # start from the uniform mixture with z at its worst payoff, which is often close to optimal. the point is
+    # feasible because z is free, even when the payoff matrix is shifted and that payoff is negative
+    uniform = np.full(num_pure_strats, 1.0 / num_pure_strats)
+    start = highspy.HighsSolution()
+    start.col_value = np.append(uniform, (uniform @ payoff_matrix).min() - shift)
+    start.value_valid = True
+    solver.setSolution(start)
+    solver.run()
+    
+    return np.asarray(solver.getSolution().col_value[:num_pure_strats])
+
+def get_equilibrium_probabilities_linprog(payoff_matrix, tol, shift=0.0):
+    """solves the equilibrium LP with scipy's linprog
+
+    Args:
+        payoff_matrix (ndarray): the payoff matrix
+        tol (float): the tolerance used for calculations
+        shift (float): the amount subtracted from every payoff in the LP, see get_payoff_shift
+
+    Returns:
+        ndarray: the (unnormalized) probability of playing each pure strategy
+    """
+    num_pure_strats = payoff_matrix.shape[0]
     
-    # print(payoff_matrix_transpose)
     # flip all the values and move z to lhs so we can use it to feed lhs_ineq
-    lhs_eq = [[]]
-    rhs_ineq = []
-    obj = []
-    bnd = []
-    for i in range(len(payoff_matrix_transpose)):
-        # make the rhs_ineq
-        rhs_ineq.append(0)
-        # make the normalization condition: x1 + x2 + x3 + ... = 1
-        lhs_eq[0].append(1)
-        # set up for minimizing -z
-        obj.append(0)
-        # set bounds 0 <= x1, x2, x3, ... <= 1
-        bnd.append((0, 1))
-        for j in range(len(payoff_matrix_transpose)):
-            payoff_matrix_transpose[i][j] = -payoff_matrix_transpose[i][j]
-        payoff_matrix_transpose[i].append(1)
+    lhs_ineq = get_constraint_matrix(payoff_matrix, normalization_row=False, shift=shift)
+    rhs_ineq = np.zeros(num_pure_strats)
     
-    # add the coefficient for z
-    lhs_eq[0].append(0)
-    # add the bounds for z
-    bnd.append((0, float("inf")))
-    lhs_ineq = payoff_matrix_transpose
-    rhs_eq = [1]
+    # make the normalization condition: x1 + x2 + x3 + ... = 1, z has coefficient 0
+    lhs_eq = np.zeros((1, num_pure_strats + 1))
+    lhs_eq[0, :num_pure_strats] = 1.0
+    rhs_eq = np.array([1.0])
     
     # goal is to maximize z, so minimize -z
-    obj.append(-1)
+    obj = np.zeros(num_pure_strats + 1)
+    obj[-1] = -1.0
     
-    # print(obj)
-    # print(lhs_ineq)
-    # print(rhs_ineq)
-    # print(lhs_eq)
-    # print(rhs_eq)
-    # print(bnd)
+    # set bounds 0 <= x1, x2, x3, ... <= 1 and leave z free, since a shifted payoff matrix has value 0
+    bnd = np.zeros((num_pure_strats + 1, 2))
+    bnd[:num_pure_strats, 1] = 1.0
+    bnd[num_pure_strats] = (-np.inf, np.inf)
     
     opt = linprog(c=obj, 
                   A_ub=lhs_ineq, 
                   b_ub=rhs_ineq,
-                  A_eq=lhs_eq, 
+                  A_eq=sparse.csr_matrix(lhs_eq), 
                   b_eq=rhs_eq, 
                   bounds=bnd,
                   method="highs",
-                  options={'primal_feasibility_tolerance': tol})
+                  options={'presolve': True,
+                           'primal_feasibility_tolerance': tol,
+                           'dual_feasibility_tolerance': tol})
+    
+    return opt.x[0:len(opt.x) - 1]
+
+def get_payoff_shift(payoff_matrix, total):
+    """gets the amount to subtract from a constant-sum payoff matrix in the LP: total / 2 if that zeroes noticeably
+    more entries than are zero already, and 0 if not. the shifted game has value 0 and the same equilibria, but
+    fewer nonzeros for HiGHS to factorize
+
+    Args:
+        payoff_matrix (ndarray): the payoff matrix
+        total (float): the constant sum of the game, None if the game is not constant-sum
+
+    Returns:
+        float: the shift, see get_constraint_matrix
+    """
+    if total is None:
+        return 0.0
+    # an evenly spaced sample of rows is enough to tell, and keeps this far cheaper than a pass over the matrix
+    sample = payoff_matrix[::max(1, len(payoff_matrix) // PAYOFF_BLOCK_ROWS)]
+    gained_zeros = np.count_nonzero(sample == total / 2) - np.count_nonzero(sample == 0)
+    if gained_zeros < MIN_SHIFT_ZERO_FRACTION * sample.size:
+        return 0.0
+    return total / 2
+
+def get_equilibrium_probabilities(payoff_matrix, tol, total=None):
+    """solves the equilibrium LP with highspy if it is installed, and with linprog if not
+
+    Args:
+        payoff_matrix (ndarray): the payoff matrix
+        tol (float): the tolerance used for calculations
+        total (float): the constant sum of the game, see get_constant_sum_total
+
+    Returns:
+        ndarray: the (unnormalized) probability of playing each pure strategy
+    """
+    shift = get_payoff_shift(payoff_matrix, total)
+    if highspy is not None:
+        return get_equilibrium_probabilities_highs(payoff_matrix, tol, shift)
+    return get_equilibrium_probabilities_linprog(payoff_matrix, tol, shift)
+
+def print_equilibrium_general_strategy(units, values, tol, obj):
+    """gets the nash equilibrium general strategy that is optimized for win or score
+
+    Args:
+        units (int): the number of units to distribute for each player
+        values (list): a list of values of each battlefield
+        tol (float): the tolerance used for calculations
+        obj (string): "win", "score", or "lottery"
+    """
     
-    # print(opt.status)
+    # the nash general strategy must be the best strategy going up against itself
+    # it must be at least as good as any pure strategy going up against the nash general strategy
+    # let z = expected_value_general_strategies(nash_gstrat, nash_gstrat, values)
+    # we must have expected_value_general_strategies(pstrat, nash_gstrat, values) <= z
+    # where pstrat is any pure strategy
+    
+    pure_strategies = get_pure_strategies(units, values)
+    total = get_constant_sum_total(values, obj)
+    orbit_reps, orbit_ids, orbit_sizes = get_game_orbits(units, tuple(values))
+    
+    if len(orbit_reps) < len(pure_strategies):
+        # some battlefields share a value, so there is an equilibrium that plays every member of an orbit equally often:
+        # solve the smaller game between orbits and spread each orbit's probability over its members
+        orbit_payoff_matrix = get_game_orbit_payoff_matrix(units, tuple(values), obj)
+        orbit_probs = get_equilibrium_probabilities(orbit_payoff_matrix, tol, total)
+        probs = orbit_probs[orbit_ids] / orbit_sizes[orbit_ids]
+    else:
+        payoff_matrix = get_game_payoff_matrix(units, tuple(values), obj)
+        probs = get_equilibrium_probabilities(payoff_matrix, tol, total)
     
-    normalized_probs = get_normalized_probability(opt.x[0:len(opt.x) - 1])
+    normalized_probs = get_normalized_probability(probs)
     
-    sum_prob = 0
-    for i in range(len(pure_strategies)):
-        if abs(normalized_probs[i] - 0) <= 1e-12:
-            continue
-        output_row = ""
-        for j in range(len(pure_strategies[i])):
-            output_row += str(pure_strategies[i][j]) + ","
-        output_row += str(normalized_probs[i])
-        sum_prob += normalized_probs[i]
-        print(output_row)
+    # only the support of the equilibrium is printed
+    output_rows = []
+    for i in np.nonzero(np.abs(normalized_probs) > 1e-12)[0]:
+        row_csv = ",".join(str(x) for x in pure_strategies[i])
+        output_rows.append(f"{row_csv},{normalized_probs[i]}")
+    sys.stdout.write("\n".join(output_rows) + "\n")
         
 def verify_equilibrium_general_strategy(g_strategy, values, tol, obj):
     """prints PASSED if g_strategy is an equilibrium strategy for both players, and the violation if not
 
     Args:
-        g_strategy (list): a list where each entry is a pure strategy followed by the probability of playing that strategy
+        g_strategy (GeneralStrategy): the general strategy to verify
         values (list): a list of values of each battlefield
         tol (float): the tolerance used for calculations
         obj (string): "win", "score", or "lottery"
     """
-    units = int(sum(g_strategy[0][0:len(g_strategy[0])-1]))
+    units = int(g_strategy.coords[0].sum())
     # print(units, file=sys.stderr)
-    pure_strategies = get_pure_strategies(units, values)
-    equilibrium_expected_value = get_expected_value_general_strategies(g_strategy, g_strategy, values, obj)
-    for s in pure_strategies:
-        s.append(1)
-        alt_expected_value = get_expected_value_general_strategies(g_strategy, [s], values, obj)
-        if alt_expected_value + tol < equilibrium_expected_value:
-            print("E[X, ({0})] = {1} < {2}".format(str(s)[1:len(str(s))-4], alt_expected_value, equilibrium_expected_value))
-            return
+    pure_strategies = get_pure_strategy_array(units, len(values))
+    total = get_constant_sum_total(values, obj)
+    if total is None:
+        equilibrium_expected_value = get_expected_value_general_strategies(g_strategy, g_strategy, values, obj)
+    else:
+        # p^T M p = p^T (total * J - M^T) p, so against itself g_strategy gets total * sum(p)^2 / 2
+        equilibrium_expected_value = 0.5 * total * g_strategy.probs.sum() ** 2
+    
+    # expected value of g_strategy against every pure strategy at once: one (support, num_pure_strats) block and one GEMV
+    alt_expected_values = g_strategy.probs @ get_payoff_block(g_strategy.coords, pure_strategies, values, obj)
+    violations = np.nonzero(alt_expected_values + tol < equilibrium_expected_value)[0]
+    if len(violations) > 0:
+        j = violations[0]
+        print("E[X, ({0})] = {1} < {2}".format(", ".join(str(x) for x in pure_strategies[j]), alt_expected_values[j], equilibrium_expected_value))
+        return
     print("PASSED")
 
 if __name__ == "__main__":
@@ -259,8 +725,7 @@ if __name__ == "__main__":
     # print(values,file=sys. stderr)
     
     if find_or_verify == "--verify":
-        raw_input = sys.stdin.readlines()
-        g_strategy = [[float(value) for value in line.strip().split(',')] for line in raw_input]
+        g_strategy = GeneralStrategy.from_rows(np.loadtxt(sys.stdin, delimiter=",", ndmin=2))
     else:
         g_strategy = None
     # print(g_strategy,file=sys.stderr)